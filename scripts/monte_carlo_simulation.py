@@ -21,10 +21,12 @@ Author: Hillary Danan & Claude (Anthropic)
 Date: January 2026
 """
 
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 from scipy import stats
 
@@ -34,7 +36,6 @@ from scipy import stats
 
 # Reproducibility
 RANDOM_SEED = 42
-np.random.seed(RANDOM_SEED)
 
 # Sample sizes
 N_PER_GROUP = 125
@@ -72,34 +73,37 @@ OUTPUT_DIR = Path(__file__).parent.parent / 'data' / 'simulated'
 # SIMULATION FUNCTIONS
 # =============================================================================
 
-def generate_belief_shifts(group: str, n: int) -> np.ndarray:
+def generate_belief_shifts(n: int, seed=RANDOM_SEED) -> np.ndarray:
     """
-    Generate synthetic belief shifts for a condition group.
+    Generate synthetic belief shifts for all condition groups in one draw.
     
-    Returns shifts clipped to realistic Likert bounds (-6 to +6).
+    Returns a (len(GROUPS), n) array with one row per group (in GROUPS
+    order), clipped to realistic Likert bounds (-6 to +6). `seed` is an
+    int or a np.random.SeedSequence.
     """
-    params = PRIORS[group]
-    shifts = np.random.normal(
-        loc=params['shift_mu'],
-        scale=params['shift_sigma'],
-        size=n
-    )
+    mu = np.array([PRIORS[g]['shift_mu'] for g in GROUPS])
+    sigma = np.array([PRIORS[g]['shift_sigma'] for g in GROUPS])
+    
+    rng = np.random.default_rng(seed)
+    shifts = rng.standard_normal((len(GROUPS), n)) * sigma[:, None] + mu[:, None]
     return np.clip(shifts, -6, 6)
 
 
-def calculate_cohens_d(group_shifts: np.ndarray, control_shifts: np.ndarray) -> float:
+def calculate_cohens_d(group_shifts: np.ndarray, control_shifts: np.ndarray) -> np.ndarray:
     """
     Calculate Cohen's d effect size relative to control.
     
-    Uses pooled standard deviation per Cohen (1988).
+    Uses pooled standard deviation per Cohen (1988). `group_shifts` may be
+    a (K, n) matrix, giving K effect sizes against the same control.
     """
-    n1, n2 = len(group_shifts), len(control_shifts)
-    var1, var2 = np.var(group_shifts, ddof=1), np.var(control_shifts, ddof=1)
+    n1, n2 = group_shifts.shape[-1], control_shifts.shape[-1]
+    var1 = np.var(group_shifts, axis=-1, ddof=1)
+    var2 = np.var(control_shifts, axis=-1, ddof=1)
     pooled_std = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
     
-    if pooled_std == 0:
-        return 0.0
-    return (np.mean(group_shifts) - np.mean(control_shifts)) / pooled_std
+    diff = np.mean(group_shifts, axis=-1) - np.mean(control_shifts, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(pooled_std > 0, diff / pooled_std, 0.0)
 
 
 def run_simulation() -> pd.DataFrame:
@@ -126,17 +130,64 @@ def run_simulation() -> pd.DataFrame:
     print("GENERATING SIMULATED DATA...")
     print("-" * 60)
     
-    data = []
-    for group in GROUPS:
-        shifts = generate_belief_shifts(group, N_PER_GROUP)
-        for i, shift in enumerate(shifts):
-            data.append({
-                'participant_id': f'{group[:3].upper()}_{i+1:03d}',
-                'group': group,
-                'belief_shift': shift
-            })
+    shifts = generate_belief_shifts(N_PER_GROUP)
+    
+    # Build columns directly (rows are group-major, matching shifts.ravel())
+    prefixes = [g[:3].upper() for g in GROUPS]
+    
+    return pd.DataFrame({
+        'participant_id': [f'{p}_{i:03d}' for p in prefixes for i in range(1, N_PER_GROUP + 1)],
+        'group': np.repeat(GROUPS, N_PER_GROUP),
+        'belief_shift': shifts.ravel()
+    })
+
+
+def _one_replicate(seed: np.random.SeedSequence) -> np.ndarray:
+    """Draw one (len(GROUPS), N_PER_GROUP) replicate of belief shifts."""
+    return generate_belief_shifts(N_PER_GROUP, seed=seed)
+
+
+def run_replicates(n_replicates: int, n_jobs: int = None) -> np.ndarray:
+    """
+    Run independent Monte Carlo replicates across worker processes.
+    
+    Child seeds are spawned from RANDOM_SEED with SeedSequence, so the
+    replicate streams are statistically independent and reproducible
+    regardless of worker count. Returns an (n_replicates, K, N) array.
+    """
+    seeds = np.random.SeedSequence(RANDOM_SEED).spawn(n_replicates)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    chunksize = max(1, n_replicates // (4 * n_jobs))
+    
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return np.stack(list(pool.map(_one_replicate, seeds, chunksize=chunksize)))
+
+
+def analyze_replicates(replicates: np.ndarray) -> dict:
+    """Summarize the sampling distribution of Cohen's d across replicates."""
+    
+    print("\n" + "=" * 60)
+    print(f"REPLICATE SUMMARY ({len(replicates)} replicates)")
+    print("=" * 60)
+    
+    control_idx = GROUPS.index('Control')
+    d_values = calculate_cohens_d(replicates, replicates[:, control_idx, None, :])
+    d_values[:, control_idx] = 0.0
+    
+    lower, upper = np.percentile(d_values, [2.5, 97.5], axis=0)
     
-    return pd.DataFrame(data)
+    summary = {}
+    for k, group in enumerate(GROUPS):
+        summary[group] = {
+            'mean_d': float(d_values[:, k].mean()),
+            'd_ci_lower': float(lower[k]),
+            'd_ci_upper': float(upper[k])
+        }
+        print(f"\n{group}:")
+        print(f"  Mean Cohen's d = {summary[group]['mean_d']:.3f} "
+              f"[95% interval: {lower[k]:.3f}, {upper[k]:.3f}]")
+    
+    return summary
 
 
 def analyze_results(df: pd.DataFrame) -> dict:
@@ -147,23 +198,27 @@ def analyze_results(df: pd.DataFrame) -> dict:
     print("=" * 60)
     
     results = {}
-    control_shifts = df[df['group'] == 'Control']['belief_shift'].values
+    grouped = df.groupby('group', sort=False)['belief_shift']
+    means, stds, counts = grouped.mean(), grouped.std(), grouped.count()
     
-    for group in GROUPS:
-        group_data = df[df['group'] == group]['belief_shift']
-        
-        mean_shift = group_data.mean()
-        std_shift = group_data.std()
-        
-        if group != 'Control':
-            d = calculate_cohens_d(group_data.values, control_shifts)
-        else:
-            d = 0.0
+    # Groups are equal-sized, so effect sizes and t-tests run on one (K, N) matrix
+    shifts = np.vstack([grouped.get_group(group).to_numpy() for group in GROUPS])
+    control_idx = GROUPS.index('Control')
+    
+    d_values = calculate_cohens_d(shifts, shifts[control_idx])
+    d_values[control_idx] = 0.0
+    t_stats, p_values = stats.ttest_1samp(shifts, 0, axis=1)
+    
+    for k, group in enumerate(GROUPS):
+        n = int(counts[group])
         
-        t_stat, p_value = stats.ttest_1samp(group_data, 0)
+        mean_shift = means[group]
+        std_shift = stds[group]
+        d = float(d_values[k])
+        t_stat, p_value = t_stats[k], p_values[k]
         
         results[group] = {
-            'n': len(group_data),
+            'n': n,
             'mean': mean_shift,
             'std': std_shift,
             'cohens_d': d,
@@ -184,16 +239,18 @@ def analyze_results(df: pd.DataFrame) -> dict:
         sig = "***" if p_value < 0.001 else "**" if p_value < 0.01 else "*" if p_value < 0.05 else "ns"
         
         print(f"\n{group}:")
-        print(f"  N = {len(group_data)}")
+        print(f"  N = {n}")
         print(f"  Mean ΔB = {mean_shift:+.3f} (SD = {std_shift:.3f})")
         print(f"  Cohen's d = {d:.3f} ({d_label})")
-        print(f"  t({len(group_data)-1}) = {t_stat:.3f}, p = {p_value:.4f} {sig}")
+        print(f"  t({n-1}) = {t_stat:.3f}, p = {p_value:.4f} {sig}")
     
     return results
 
 
-def create_visualizations(df: pd.DataFrame, results: dict):
+def create_visualizations(df: pd.DataFrame, results: dict, dpi: int = 300):
     """Generate publication-quality figures."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     FIGURES_DIR = Path(__file__).parent.parent / 'results' / 'figures'
@@ -203,11 +260,10 @@ def create_visualizations(df: pd.DataFrame, results: dict):
     sns.set_palette("Set2")
     
     # Figure 1: Boxplot
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, ax = plt.subplots(figsize=(10, 6), constrained_layout=True)
     order = ['Sycophancy', 'Neutral', 'Adversarial', 'Control']
     
-    sns.boxplot(data=df, x='group', y='belief_shift', order=order, width=0.5, showfliers=False, ax=ax)
-    sns.stripplot(data=df, x='group', y='belief_shift', order=order, alpha=0.3, size=4, ax=ax)
+    sns.boxplot(data=df, x='group', y='belief_shift', order=order, width=0.5, showfliers=True, ax=ax)
     
     ax.axhline(y=0, color='red', linestyle='--', alpha=0.5, linewidth=1.5)
     ax.set_xlabel('Experimental Condition', fontsize=12)
@@ -220,12 +276,11 @@ def create_visualizations(df: pd.DataFrame, results: dict):
         ax.annotate(f'd = {d:.2f}', xy=(i, mean), xytext=(10, 0),
                     textcoords='offset points', fontsize=9, ha='left')
     
-    plt.tight_layout()
-    fig.savefig(FIGURES_DIR / 'simulated_results.png', dpi=300, bbox_inches='tight')
+    fig.savefig(FIGURES_DIR / 'simulated_results.png', dpi=dpi, bbox_inches='tight')
     print(f"\nSaved: {FIGURES_DIR / 'simulated_results.png'}")
     
     # Figure 2: Distributions
-    fig2, axes = plt.subplots(2, 2, figsize=(12, 10))
+    fig2, axes = plt.subplots(2, 2, figsize=(12, 10), constrained_layout=True)
     axes = axes.flatten()
     
     for i, group in enumerate(order):
@@ -238,9 +293,8 @@ def create_visualizations(df: pd.DataFrame, results: dict):
         ax.set_xlabel('Belief Shift')
         ax.set_xlim(-4, 4)
     
-    plt.suptitle('Distribution of Belief Shifts by Condition\n(Simulated Data)', fontsize=14, y=1.02)
-    plt.tight_layout()
-    fig2.savefig(FIGURES_DIR / 'distributions.png', dpi=300, bbox_inches='tight')
+    fig2.suptitle('Distribution of Belief Shifts by Condition\n(Simulated Data)', fontsize=14)
+    fig2.savefig(FIGURES_DIR / 'distributions.png', dpi=dpi, bbox_inches='tight')
     print(f"Saved: {FIGURES_DIR / 'distributions.png'}")
     
     plt.close('all')
@@ -276,11 +330,26 @@ def save_data(df: pd.DataFrame, results: dict):
 # =============================================================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Monte Carlo simulation of belief shifts')
+    parser.add_argument('--replicates', type=int, default=0,
+                        help='Also run N independent replicates to summarize effect-size variability')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Worker processes for replicates (default: all cores)')
+    parser.add_argument('--figures', action='store_true',
+                        help='Render figures to results/figures (skipped by default)')
+    parser.add_argument('--dpi', type=int, default=300,
+                        help='Figure resolution (300 for publication, 150 for drafts)')
+    args = parser.parse_args()
+    
     df = run_simulation()
     results = analyze_results(df)
-    create_visualizations(df, results)
+    if args.figures:
+        create_visualizations(df, results, dpi=args.dpi)
     save_data(df, results)
     
+    if args.replicates > 0:
+        analyze_replicates(run_replicates(args.replicates, n_jobs=args.jobs))
+    
     print("\n" + "=" * 60)
     print("SIMULATION COMPLETE")
     print("=" * 60)
@@ -17,7 +17,7 @@ if [ -f ".venv/bin/activate" ]; then
 fi
 
 # Run simulation
-python3 scripts/monte_carlo_simulation.py
+python3 scripts/monte_carlo_simulation.py --figures "$@"
 
 echo ""
 echo "Output files:"
@@ -10,10 +10,13 @@ Implements the pre-registered statistical analyses:
 
 References:
 - Cohen, J. (1988). Statistical Power Analysis for the Behavioral Sciences.
+- Efron, B. (1987). Better bootstrap confidence intervals. JASA, 82(397).
 """
 
+import inspect
 import numpy as np
 from scipy import stats
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
 
 # =============================================================================
@@ -31,16 +34,19 @@ def cohens_d_independent(group1: List[float], group2: List[float]) -> float:
     - Medium: d = 0.5
     - Large: d = 0.8
     """
-    n1, n2 = len(group1), len(group2)
-    var1, var2 = np.var(group1, ddof=1), np.var(group2, ddof=1)
+    a = np.asarray(group1, dtype=float)
+    b = np.asarray(group2, dtype=float)
+    n1, n2 = a.size, b.size
+    m1, m2 = a.mean(), b.mean()
     
-    # Pooled standard deviation
-    pooled_std = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
+    # Pooled standard deviation: (n - 1) * var is the sum of squared deviations
+    dev1, dev2 = a - m1, b - m2
+    pooled_std = np.sqrt((np.dot(dev1, dev1) + np.dot(dev2, dev2)) / (n1 + n2 - 2))
     
     if pooled_std == 0:
         return 0.0
     
-    return (np.mean(group1) - np.mean(group2)) / pooled_std
+    return (m1 - m2) / pooled_std
 
 def cohens_d_paired(differences: List[float]) -> float:
     """
@@ -53,12 +59,18 @@ def cohens_d_paired(differences: List[float]) -> float:
         return 0.0
     return np.mean(differences) / std
 
+@lru_cache(maxsize=256)
+def _t_crit(confidence: float, dof: int) -> float:
+    """Two-sided critical t value; t.ppf is a numerical inversion, so memoize."""
+    return float(stats.t.ppf((1 + confidence) / 2, dof))
+
 def confidence_interval(data: List[float], confidence: float = 0.95) -> Tuple[float, float]:
     """Compute confidence interval for mean."""
-    n = len(data)
-    mean = np.mean(data)
-    se = stats.sem(data)
-    h = se * stats.t.ppf((1 + confidence) / 2, n - 1)
+    data = np.asarray(data, dtype=float)
+    n = data.size
+    mean = data.mean()
+    se = data.std(ddof=1) / np.sqrt(n)
+    h = se * _t_crit(confidence, n - 1)
     return (mean - h, mean + h)
 
 # =============================================================================
@@ -92,7 +104,8 @@ def test_sycophancy_h1(
     p_one_tailed = p_two_tailed / 2 if t_stat > 0 else 1 - p_two_tailed / 2
     
     # Effect size: d = mean / sd
-    d = mean_si / np.std(sycophancy_indices, ddof=1) if np.std(sycophancy_indices) > 0 else 0
+    sd = float(np.std(sycophancy_indices, ddof=1))
+    d = mean_si / sd if sd > 0 else 0
     
     # CI
     ci = confidence_interval(sycophancy_indices)
@@ -101,7 +114,7 @@ def test_sycophancy_h1(
         'test': 'One-sample t-test (H1: SI > 0)',
         'n': n,
         'mean_si': float(mean_si),
-        'sd': float(np.std(sycophancy_indices, ddof=1)),
+        'sd': sd,
         't_statistic': float(t_stat),
         'p_value_one_tailed': float(p_one_tailed),
         'alpha': alpha,
@@ -136,7 +149,7 @@ def test_adversarial_h2(
     adversarial = np.array(adversarial_scores[:n])
     
     differences = adversarial - neutral
-    mean_diff = np.mean(differences)
+    mean_diff = differences.mean()
     
     # Paired t-test
     t_stat, p_two_tailed = stats.ttest_rel(adversarial, neutral)
@@ -150,8 +163,8 @@ def test_adversarial_h2(
     return {
         'test': 'Paired t-test (H2: adversarial > neutral)',
         'n_pairs': n,
-        'mean_neutral': float(np.mean(neutral)),
-        'mean_adversarial': float(np.mean(adversarial)),
+        'mean_neutral': float(neutral.mean()),
+        'mean_adversarial': float(adversarial.mean()),
         'mean_difference': float(mean_diff),
         't_statistic': float(t_stat),
         'p_value_one_tailed': float(p_one_tailed),
@@ -186,26 +199,40 @@ def test_model_differences_h3(
     # One-way ANOVA
     f_stat, p_value = stats.f_oneway(*groups)
     
+    # Per-group n, mean and sum of squared deviations, computed once
+    arrays = [np.asarray(g, dtype=float) for g in groups]
+    ns = np.array([a.size for a in arrays], dtype=float)
+    means = np.array([a.mean() for a in arrays])
+    ss_within = np.array([np.dot(a - m, a - m) for a, m in zip(arrays, means)])
+    
     # Effect size: eta-squared
-    grand_mean = np.mean([x for g in groups for x in g])
-    ss_between = sum(len(g) * (np.mean(g) - grand_mean)**2 for g in groups)
-    ss_total = sum((x - grand_mean)**2 for g in groups for x in g)
+    grand_mean = np.dot(ns, means) / ns.sum()
+    ss_between = np.dot(ns, (means - grand_mean) ** 2)
+    ss_total = ss_between + ss_within.sum()
     eta_squared = ss_between / ss_total if ss_total > 0 else 0
     
     # Post-hoc (Tukey HSD) if significant
     posthoc = None
     if p_value < alpha and len(groups) >= 2:
-        # Simple pairwise comparisons
-        posthoc = {}
-        for i, name1 in enumerate(group_names):
-            for j, name2 in enumerate(group_names):
-                if i < j:
-                    t, p = stats.ttest_ind(groups[i], groups[j])
-                    posthoc[f"{name1}_vs_{name2}"] = {
-                        't': float(t),
-                        'p': float(p),
-                        'd': float(cohens_d_independent(groups[i], groups[j]))
-                    }
+        # Simple pairwise comparisons: pooled-variance t-tests (as
+        # stats.ttest_ind) and Cohen's d for every pair at once
+        i, j = np.triu_indices(len(groups), 1)
+        dof = ns[i] + ns[j] - 2
+        pooled_std = np.sqrt((ss_within[i] + ss_within[j]) / dof)
+        diff = means[i] - means[j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = diff / (pooled_std * np.sqrt(1 / ns[i] + 1 / ns[j]))
+            d = np.where(pooled_std > 0, diff / pooled_std, 0.0)
+        p = 2 * stats.t.sf(np.abs(t), dof)
+        
+        posthoc = {
+            f"{group_names[a]}_vs_{group_names[b]}": {
+                't': float(t_ab),
+                'p': float(p_ab),
+                'd': float(d_ab)
+            }
+            for a, b, t_ab, p_ab, d_ab in zip(i, j, t, p, d)
+        }
     
     return {
         'test': 'One-way ANOVA (H3: model differences)',
@@ -224,30 +251,115 @@ def test_model_differences_h3(
 # BOOTSTRAP UTILITIES
 # =============================================================================
 
+def _resample_counts(n: int, n_bootstrap: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    (n_bootstrap, n) matrix of how often each observation is drawn per
+    resample; equivalent to sampling n indices with replacement.
+    """
+    return rng.multinomial(n, np.full(n, 1 / n), size=n_bootstrap)
+
+def _bootstrap_mean(data: np.ndarray, n_bootstrap: int, rng: np.random.Generator) -> np.ndarray:
+    """Bootstrap distribution of the mean as one matrix-vector product."""
+    counts = _resample_counts(len(data), n_bootstrap, rng)
+    return counts @ data / len(data)
+
+def _bootstrap_std(data: np.ndarray, n_bootstrap: int, rng: np.random.Generator) -> np.ndarray:
+    """Bootstrap distribution of np.std (ddof=0) from the same resample counts."""
+    counts = _resample_counts(len(data), n_bootstrap, rng)
+    # Center first: the SD is shift-invariant, and E[x²] - E[x]² cancels
+    # catastrophically when the mean is large relative to the spread
+    centered = data - data.mean()
+    mean = counts @ centered / len(data)
+    mean_sq = counts @ (centered ** 2) / len(data)
+    return np.sqrt(np.maximum(mean_sq - mean ** 2, 0))
+
+# Drawing the counts takes ~98% of the kernel time and the reduction is a
+# single BLAS call, so compiling these with numba (the _jit pattern in
+# embeddings.py) would not speed them up; a parallel numba kernel would also
+# need per-thread RNG streams, making the CI depend on the thread count.
+# The multinomial draws are a different random stream from per-resample
+# index sampling, so percentile CIs differ slightly from the old loop's.
+_BOOTSTRAP_KERNELS = {np.mean: _bootstrap_mean, np.std: _bootstrap_std}
+
+def _accepts_axis(statistic: callable) -> bool:
+    """
+    Whether `statistic` takes an `axis` keyword, decided before any
+    resampling so errors raised by the statistic itself are not mistaken
+    for a missing `axis`. Callables without an inspectable signature are
+    probed once on a tiny input.
+    """
+    try:
+        params = inspect.signature(statistic).parameters.values()
+    except (TypeError, ValueError):
+        try:
+            statistic(np.zeros((2, 2)), axis=1)
+        except TypeError:
+            return False
+        return True
+    return any(p.name == 'axis' or p.kind == p.VAR_KEYWORD for p in params)
+
+def _scipy_bootstrap(
+    data: np.ndarray,
+    statistic: callable,
+    n_bootstrap: int,
+    confidence: float,
+    method: str,
+    rng: np.random.Generator
+) -> Tuple[float, float]:
+    """CI bounds from scipy.stats.bootstrap, vectorized when `statistic` takes `axis`."""
+    kwargs = dict(n_resamples=n_bootstrap, confidence_level=confidence,
+                  method=method, random_state=rng)
+    if _accepts_axis(statistic):
+        res = stats.bootstrap((data,), lambda x, axis: statistic(x, axis=axis),
+                              vectorized=True, **kwargs)
+    else:
+        res = stats.bootstrap((data,), statistic, vectorized=False, **kwargs)
+    return res.confidence_interval.low, res.confidence_interval.high
+
 def bootstrap_ci(
     data: List[float],
     statistic: callable = np.mean,
     n_bootstrap: int = 1000,
-    confidence: float = 0.95
+    confidence: float = 0.95,
+    method: str = 'BCa'
 ) -> Tuple[float, float, float]:
     """
     Bootstrap confidence interval.
     
+    method='BCa' (bias-corrected and accelerated, Efron 1987) and 'basic'
+    use scipy.stats.bootstrap. method='percentile' uses the local
+    resampling below: np.mean and np.std take a fast path that computes
+    every resample from a matrix of draw counts; other statistics are
+    evaluated once on an (n_bootstrap, n) matrix of resamples.
+    
+    `statistic` should accept `axis` (NumPy reductions do) so it can be
+    applied to all resamples at once; otherwise it is applied per resample.
+    
     Returns:
         (point_estimate, ci_lower, ci_upper)
     """
     rng = np.random.default_rng(42)
-    data = np.array(data)
+    data = np.array(data, dtype=float)
+    point = statistic(data)
     
-    boot_stats = []
-    for _ in range(n_bootstrap):
-        sample = rng.choice(data, size=len(data), replace=True)
-        boot_stats.append(statistic(sample))
+    if method != 'percentile':
+        ci_lower, ci_upper = _scipy_bootstrap(data, statistic, n_bootstrap, confidence, method, rng)
+        return float(point), float(ci_lower), float(ci_upper)
+    
+    kernel = _BOOTSTRAP_KERNELS.get(statistic)
+    if kernel is not None:
+        boot_stats = kernel(data, n_bootstrap, rng)
+    else:
+        samples = data[rng.integers(0, len(data), size=(n_bootstrap, len(data)))]
+        if _accepts_axis(statistic):
+            boot_stats = statistic(samples, axis=1)
+        else:
+            boot_stats = np.empty(n_bootstrap)
+            for i, sample in enumerate(samples):
+                boot_stats[i] = statistic(sample)
     
-    point = statistic(data)
     alpha = (1 - confidence) / 2
-    ci_lower = np.percentile(boot_stats, alpha * 100)
-    ci_upper = np.percentile(boot_stats, (1 - alpha) * 100)
+    ci_lower, ci_upper = np.percentile(boot_stats, [alpha * 100, (1 - alpha) * 100])
     
     return float(point), float(ci_lower), float(ci_upper)
 
@@ -4,6 +4,7 @@ Configuration for Protocol A: Sycophancy Study
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -22,6 +23,7 @@ RESULTS_DIR = ROOT_DIR / "results"
 FIGURES_DIR = RESULTS_DIR / "figures"
 PROTOCOL_DIR = ROOT_DIR / "protocol"
 STIMULI_PATH = PROTOCOL_DIR / "stimuli.json"
+RESPONSE_CACHE_PATH = RAW_DIR / "response_cache.sqlite"
 
 # Create directories if they don't exist
 for dir_path in [RAW_DIR, PROCESSED_DIR, SIMULATED_DIR, FIGURES_DIR]:
@@ -106,8 +108,14 @@ PROMPT_TEMPLATES = {
 # API KEYS (from environment)
 # =============================================================================
 
+@lru_cache(maxsize=None)
 def get_api_key(provider: str) -> str:
-    """Get API key for provider from environment."""
+    """
+    Get API key for provider from environment.
+    
+    Cached per provider; a missing key raises and is not cached, so it is
+    looked up again on the next call.
+    """
     key_map = {
         'anthropic': 'ANTHROPIC_API_KEY',
         'openai': 'OPENAI_API_KEY',
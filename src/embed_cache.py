@@ -0,0 +1,165 @@
+"""
+Persistent Embedding Cache
+==========================
+
+Content-addressed on-disk store for embedding vectors, shared across runs
+so repeat analyses only embed texts they have not seen before.
+
+Vectors are float32 rows appended to a flat binary file that is read
+through np.memmap; a JSON sidecar maps each key to its row. Keys hash the
+embedding model together with the text, so vectors from different models
+never mix and the cache survives changes in trial order.
+
+Also holds the in-memory precision setting (EMBED_DTYPE) shared by
+analyze.py and analysis/embeddings.py, so both analyzers quantize alike.
+"""
+
+import os
+import json
+import hashlib
+from functools import lru_cache
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the stdlib json module
+    orjson = None
+
+# In-memory precision for embeddings, from the EMBED_DTYPE environment
+# variable. float32 (default) halves memory versus float64; float16 halves
+# it again (cosine error ~1e-4) and int8 (per-vector max-abs scaling,
+# cosine error ~3e-4) quarters it. The on-disk cache is always float32.
+EMBED_DTYPES = ('float32', 'float16', 'int8')
+
+@lru_cache(maxsize=None)
+def embed_dtype() -> np.dtype:
+    """
+    The EMBED_DTYPE setting, read and validated on first use (not at import,
+    so a bad value only affects code that actually handles embeddings).
+    """
+    name = os.getenv('EMBED_DTYPE', 'float32')
+    if name not in EMBED_DTYPES:
+        raise ValueError(f"EMBED_DTYPE must be one of {', '.join(EMBED_DTYPES)}, got {name!r}")
+    return np.dtype(name)
+
+def to_storage(embeddings: np.ndarray) -> np.ndarray:
+    """Quantize float32 embeddings (one per row, or a single vector) to embed_dtype()."""
+    dtype = embed_dtype()
+    if dtype != np.int8:
+        return embeddings.astype(dtype, copy=False)
+    peak = np.abs(embeddings).max(axis=-1, keepdims=True)
+    scale = np.divide(127, peak, out=np.zeros_like(peak), where=peak > 0)
+    return np.round(embeddings * scale).astype(np.int8)
+
+def from_storage(stored: np.ndarray) -> np.ndarray:
+    """
+    float32 embeddings from to_storage output.
+    
+    int8 codes drop each vector's scale, so they come back L2-normalized;
+    OpenAI embeddings are unit length and only cosines are used downstream.
+    """
+    if embed_dtype() != np.int8:
+        return stored.astype(np.float32, copy=False)
+    embeddings = stored.astype(np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+    return embeddings
+
+def cache_key(text: str, model: str) -> str:
+    """Stable content hash of (model, text); unlike hash(), not salted per process."""
+    return hashlib.blake2b(f"{model}:{text}".encode('utf-8'), digest_size=16).hexdigest()
+
+class EmbeddingCache:
+    """Memmapped float32 matrix plus a {key: row} JSON index."""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path.with_suffix('.json')
+        self.dim = None
+        self.rows = {}
+        self._matrix = None
+        
+        if self.index_path.exists():
+            if orjson is not None:
+                index = orjson.loads(self.index_path.read_bytes())
+            else:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            self.dim = index['dim']
+            self.rows = index['rows']
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Stored vector for `key`, or None."""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if self._matrix is None:
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode='r',
+                                     shape=(len(self.rows), self.dim))
+        return np.array(self._matrix[row])
+    
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Append new vectors and rewrite the index once."""
+        items = {k: v for k, v in items.items() if k not in self.rows}
+        if not items:
+            return
+        
+        block = np.stack(list(items.values())).astype(np.float32)
+        if self.dim is None:
+            self.dim = block.shape[1]
+        elif block.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {block.shape[1]} does not match cache ({self.dim})")
+        
+        # Drop any rows left by an interrupted write before appending
+        n = len(self.rows)
+        with open(self.path, 'r+b' if self.path.exists() else 'wb') as f:
+            f.truncate(n * self.dim * 4)
+            f.seek(0, 2)
+            f.write(block.tobytes())
+        
+        for i, key in enumerate(items):
+            self.rows[key] = n + i
+        
+        # Write the index beside the old one and swap it in, so an interrupt
+        # can never leave a truncated index behind
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'dim': self.dim, 'rows': self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+        
+        self._matrix = None
+
+def get_or_compute(
+    cache: EmbeddingCache,
+    texts: List[str],
+    model: str,
+    compute: Callable[[List[str]], np.ndarray]
+) -> np.ndarray:
+    """
+    Embeddings for `texts` as a (len(texts), D) float32 matrix.
+    
+    Hits are read from `cache`; the misses are passed to `compute` in a
+    single call (which should return one row per text, in order) and
+    stored before returning.
+    """
+    keys = [cache_key(text, model) for text in texts]
+    found = {key: cache.get(key) for key in dict.fromkeys(keys)}
+    
+    misses = [key for key, emb in found.items() if emb is None]
+    if misses:
+        text_for = dict(zip(keys, texts))
+        computed = dict(zip(misses, compute([text_for[key] for key in misses])))
+        cache.put_many(computed)
+        found.update(computed)
+    
+    if not keys:
+        return np.empty((0, cache.dim or 0), dtype=np.float32)
+    return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
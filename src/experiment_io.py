@@ -0,0 +1,169 @@
+"""
+Experiment File I/O
+===================
+
+Reading and writing raw experiment files ({'metadata': ..., 'trials': [...]}).
+
+Three formats, chosen by file suffix:
+
+    .json     One indented JSON document (default; human-readable)
+    .parquet  Trials as a zstd-compressed columnar table, with the metadata
+              block stored as JSON in the file's schema metadata. Much
+              smaller than JSON, and readers can load only the columns
+              they need. Requires pyarrow.
+    .ndjson   One JSON object per line: {"metadata": ...} first, then one
+              line per trial. Written incrementally by ExperimentWriter while
+              an experiment runs, so a crashed run keeps every finished trial.
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the stdlib json module
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional; only needed for .parquet experiment files
+    pa = pq = None
+
+EXPERIMENT_SUFFIXES = ('.json', '.parquet', '.ndjson')
+
+# Schema metadata key holding the experiment's metadata block
+_METADATA_KEY = b'experiment'
+
+def require_pyarrow():
+    """Raise ImportError unless pyarrow (needed for .parquet files) is installed."""
+    if pq is None:
+        raise ImportError("Parquet experiment files require pyarrow (pip install pyarrow)")
+
+def _dumps_line(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return json.dumps(obj).encode('utf-8') + b"\n"
+
+def _loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class ExperimentWriter:
+    """
+    Append-only .ndjson experiment file.
+    
+    The metadata line is written on open and each trial is flushed as soon
+    as it is appended, so memory use does not grow with the run and a crash
+    loses at most the line being written. append() is thread-safe.
+    """
+    
+    def __init__(self, path: Path, metadata: dict):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._write({'metadata': metadata})
+    
+    def _write(self, obj):
+        self._file.write(_dumps_line(obj))
+        self._file.flush()
+    
+    def append(self, trial: dict):
+        with self._lock:
+            self._write(trial)
+    
+    def close(self):
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def _load_ndjson(path: Path) -> dict:
+    """Read an .ndjson experiment, skipping a final line cut off by a crash."""
+    with open(path, 'rb') as f:
+        metadata = _loads(f.readline())['metadata']
+        trials = []
+        for line in f:
+            try:
+                trials.append(_loads(line))
+            except ValueError:
+                if line.endswith(b"\n"):
+                    raise
+    return {'metadata': metadata, 'trials': trials}
+
+def save_experiment(results: dict, path: Path):
+    """Write an experiment file in the format given by `path`'s suffix."""
+    if path.suffix == '.parquet':
+        require_pyarrow()
+        trials = results['trials']
+        # Failed and successful trials carry different keys; use their union
+        # so no column is dropped (missing values are stored as null)
+        columns = dict.fromkeys(key for trial in trials for key in trial)
+        table = pa.Table.from_pydict({key: [trial.get(key) for trial in trials] for key in columns})
+        table = table.replace_schema_metadata({_METADATA_KEY: json.dumps(results['metadata'])})
+        pq.write_table(table, path, compression='zstd')
+        return
+    
+    if path.suffix == '.ndjson':
+        with ExperimentWriter(path, results['metadata']) as writer:
+            for trial in results['trials']:
+                writer.append(trial)
+        return
+    
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+def load_experiment(path: Path, columns: Optional[List[str]] = None) -> dict:
+    """
+    Read an experiment file written by save_experiment.
+    
+    For Parquet files only `columns` are read (all when None); JSON files
+    are always parsed whole. Trial keys absent from a Parquet row come back
+    as None, so read them with .get().
+    """
+    if path.suffix == '.parquet':
+        require_pyarrow()
+        table = pq.read_table(path, columns=columns)
+        return {
+            'metadata': json.loads(table.schema.metadata[_METADATA_KEY]),
+            'trials': table.to_pylist()
+        }
+    
+    if path.suffix == '.ndjson':
+        return _load_ndjson(path)
+    
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path) as f:
+        return json.load(f)
+
+def find_latest_experiment_file(directory: Path) -> Optional[Path]:
+    """
+    Most recently modified experiment_* file in `directory` with a readable
+    suffix, or None.
+    
+    One os.scandir pass; DirEntry.stat() reuses what the directory scan
+    already fetched where the platform provides it, so no Path objects are
+    built and no extra stat calls are made per file.
+    """
+    best, best_mtime = None, -1.0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('experiment_') and entry.name.endswith(EXPERIMENT_SUFFIXES):
+                    mtime = entry.stat().st_mtime
+                    if mtime > best_mtime:
+                        best, best_mtime = entry.path, mtime
+    except FileNotFoundError:
+        return None
+    return Path(best) if best else None
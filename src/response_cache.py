@@ -0,0 +1,102 @@
+"""
+Persistent API Response Cache
+=============================
+
+SQLite store of successful model responses, shared across runs so
+re-running an experiment (for example after adding a model) only calls
+the API for responses that have not been collected yet.
+
+Trials cycle through the stimuli, so one run sends the same prompt to a
+model several times; each of those is an independent replicate. Entries
+are therefore keyed by (model, settings, prompt digest, replicate), where
+replicate is the occurrence index of the prompt within the run: replicate
+k of a new run reuses only replicate k of an earlier one, and repeats
+within a run never share a response.
+
+The model part of the key is the full model name from config.MODELS, so
+switching a model key to a new version never reuses the old version's
+responses. The settings part is the rest of the model's config entry
+(max_tokens etc.), so changing a generation parameter makes stored
+responses misses instead of silently reusing ones generated under the old
+setting. The prompt digest is a full-width (128-bit) hash of the prompt
+text rather than the short trial prompt_hash, so a collision cannot hand
+back another prompt's answer.
+
+Each row keeps the time its response was collected, which reused trials
+report as their timestamp.
+"""
+
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+def prompt_digest(prompt: str) -> str:
+    """128-bit content hash of a prompt, for cache keys."""
+    return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+
+def _settings(config: dict) -> str:
+    """Canonical JSON of a config.MODELS entry's generation parameters."""
+    return json.dumps({k: v for k, v in config.items() if k != 'name'}, sort_keys=True)
+
+class ResponseCache:
+    """(model, settings, prompt_digest, replicate) -> response table; safe to share across threads."""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " model TEXT NOT NULL,"
+                " settings TEXT NOT NULL,"
+                " prompt_digest TEXT NOT NULL,"
+                " replicate INTEGER NOT NULL,"
+                " response TEXT,"
+                " input_tokens INTEGER,"
+                " output_tokens INTEGER,"
+                " ts TEXT NOT NULL,"
+                " PRIMARY KEY (model, settings, prompt_digest, replicate))"
+            )
+    
+    def get(self, config: dict, digest: str, replicate: int) -> Optional[dict]:
+        """
+        Stored result in the call_* format, plus the 'timestamp' at which
+        it was collected, or None. `config` is the model's config.MODELS entry.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, input_tokens, output_tokens, ts FROM responses"
+                " WHERE model = ? AND settings = ? AND prompt_digest = ? AND replicate = ?",
+                (config['name'], _settings(config), digest, replicate)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'success': True,
+            'response': row[0],
+            'input_tokens': row[1],
+            'output_tokens': row[2],
+            'timestamp': row[3]
+        }
+    
+    def put(self, config: dict, digest: str, replicate: int, result: dict):
+        """Store a successful trial result, keeping its 'timestamp' when present."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (config['name'], _settings(config), digest, replicate, result.get('response'),
+                 result.get('input_tokens'), result.get('output_tokens'),
+                 result.get('timestamp') or datetime.now().isoformat())
+            )
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    
+    def close(self):
+        self._conn.close()
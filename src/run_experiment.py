@@ -11,17 +11,33 @@ Usage:
     python3 src/run_experiment.py --n 50  # Full study
 """
 
+import sys
 import json
 import time
 import argparse
 import hashlib
+import threading
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the stdlib json module
+    orjson = None
+
+try:
+    from tqdm import tqdm
+except ImportError:  # Optional; falls back to a plain progress line
+    tqdm = None
 
 from config import (
     MODELS, CONDITIONS, PROMPT_TEMPLATES, STIMULI_PATH,
-    RAW_DIR, REQUEST_DELAY, RANDOM_SEED, get_api_key
+    RAW_DIR, RESPONSE_CACHE_PATH, REQUEST_DELAY, RANDOM_SEED, get_api_key
 )
+from experiment_io import ExperimentWriter, require_pyarrow, save_experiment
+from response_cache import ResponseCache, prompt_digest
 
 # =============================================================================
 # API CLIENTS
@@ -39,6 +55,21 @@ def get_gemini_client():
     from google import genai
     return genai.Client(api_key=get_api_key('google'))
 
+CLIENT_FACTORIES = {'claude': get_anthropic_client, 'gpt5': get_openai_client, 'gemini': get_gemini_client}
+
+_clients = {}
+
+def get_client(model_key: str):
+    """
+    Client for `model_key`, created on first use and reused afterwards.
+    
+    Each factory imports its provider SDK, so only the SDKs of the models
+    actually being run are ever imported.
+    """
+    if model_key not in _clients:
+        _clients[model_key] = CLIENT_FACTORIES[model_key]()
+    return _clients[model_key]
+
 # =============================================================================
 # API CALLS
 # =============================================================================
@@ -96,10 +127,42 @@ def call_gemini(client, prompt: str, config: dict) -> dict:
 
 def load_stimuli() -> list:
     """Load stimuli from JSON file."""
+    if orjson is not None:
+        return orjson.loads(STIMULI_PATH.read_bytes())['stimuli']
     with open(STIMULI_PATH) as f:
         data = json.load(f)
     return data['stimuli']
 
+@lru_cache(maxsize=None)
+def _make_prompt(condition: str, statement: str, justification_pro: str,
+                 justification_con: str) -> tuple:
+    """
+    (prompt, prompt_hash) for one condition and stimulus.
+    
+    Trials cycle through the stimuli, so for n_per_condition > len(stimuli)
+    most prompts repeat; each distinct prompt is formatted and hashed once,
+    and interned so every trial using it shares one string.
+    """
+    template = PROMPT_TEMPLATES[condition]
+    
+    # Build prompt based on condition
+    if condition == "sycophancy_pro":
+        prompt = template.format(
+            statement=statement,
+            justification_pro=justification_pro
+        )
+    elif condition == "sycophancy_con":
+        prompt = template.format(
+            statement=statement,
+            justification_con=justification_con
+        )
+    else:
+        prompt = template.format(statement=statement)
+    
+    # 32-bit content hash (8 hex chars, as before). blake2b with a 4-byte
+    # digest is faster than MD5 and needs no truncation
+    return sys.intern(prompt), hashlib.blake2b(prompt.encode(), digest_size=4).hexdigest()
+
 def generate_trials(n_per_condition: int) -> list:
     """Generate trial list for experiment."""
     stimuli = load_stimuli()
@@ -109,21 +172,10 @@ def generate_trials(n_per_condition: int) -> list:
     for condition in CONDITIONS:
         for i in range(n_per_condition):
             stim = stimuli[i % len(stimuli)]
-            template = PROMPT_TEMPLATES[condition]
-            
-            # Build prompt based on condition
-            if condition == "sycophancy_pro":
-                prompt = template.format(
-                    statement=stim['statement'],
-                    justification_pro=stim['justification_pro']
-                )
-            elif condition == "sycophancy_con":
-                prompt = template.format(
-                    statement=stim['statement'],
-                    justification_con=stim['justification_con']
-                )
-            else:
-                prompt = template.format(statement=stim['statement'])
+            prompt, prompt_hash = _make_prompt(
+                condition, stim['statement'],
+                stim['justification_pro'], stim['justification_con']
+            )
             
             trials.append({
                 'trial_id': f"T{trial_id:04d}",
@@ -134,7 +186,7 @@ def generate_trials(n_per_condition: int) -> list:
                 'con_justification': stim['justification_con'],
                 'condition': condition,
                 'prompt': prompt,
-                'prompt_hash': hashlib.md5(prompt.encode()).hexdigest()[:8]
+                'prompt_hash': prompt_hash
             })
             trial_id += 1
     
@@ -144,7 +196,100 @@ def generate_trials(n_per_condition: int) -> list:
 # MAIN EXPERIMENT
 # =============================================================================
 
-def run_experiment(models_to_run: list, n_per_condition: int, dry_run: bool = False):
+class RateLimiter:
+    """
+    Start calls at least `min_interval` seconds apart.
+    
+    Unlike sleeping a fixed delay after every call, time already spent
+    waiting on the API counts toward the interval, so slow calls are not
+    padded further. Uses the monotonic clock; one limiter per thread.
+    """
+    
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._last = None
+    
+    def wait(self):
+        """Block until the next call may start, and record its start."""
+        now = time.monotonic()
+        if self._last is not None:
+            remaining = self.min_interval - (now - self._last)
+            if remaining > 0:
+                time.sleep(remaining)
+                now = time.monotonic()
+        self._last = now
+
+def run_model_trials(model_key: str, client, call_func, trials: list,
+                     dry_run: bool, report=None, on_result=None, cache=None,
+                     stop=None) -> list:
+    """
+    Run every trial against one model, starting API calls at most once
+    per REQUEST_DELAY.
+    
+    Models are independent (separate providers and rate limits), so
+    run_experiment runs one of these per model in its own thread.
+    `report(model_key, trial)` is called before each trial for progress,
+    and `on_result(result)` with each finished result.
+    
+    With a ResponseCache, replicates this model has already answered with
+    the same generation parameters are taken from it (marked 'cached':
+    True, with the timestamp of the original call) without an API call or
+    delay, and new successful responses are added to it. A prompt's k-th
+    occurrence in `trials` only reuses a stored k-th replicate, so repeats
+    within a run are always separate responses.
+    
+    `stop` is an optional threading.Event; once it is set no further API
+    calls are started and the trials finished so far are returned.
+    """
+    config = MODELS[model_key]
+    limiter = RateLimiter(REQUEST_DELAY)
+    occurrences = {}
+    results = []
+    
+    for trial in trials:
+        if stop is not None and stop.is_set():
+            break
+        if report is not None:
+            report(model_key, trial)
+        
+        result = {
+            'model': model_key,
+            'model_name': config['name'],
+            **trial,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        if dry_run:
+            result['response'] = "[DRY RUN]"
+            result['success'] = True
+            result['dry_run'] = True
+        else:
+            digest = prompt_digest(trial['prompt'])
+            replicate = occurrences.get(digest, 0)
+            occurrences[digest] = replicate + 1
+            
+            cached = cache.get(config, digest, replicate) if cache is not None else None
+            if cached is not None:
+                # Keeps the timestamp of when the response was collected
+                result.update(cached)
+                result['cached'] = True
+            else:
+                limiter.wait()
+                if stop is not None and stop.is_set():
+                    break
+                api_result = call_func(client, trial['prompt'], config)
+                result.update(api_result)
+                if cache is not None and api_result.get('success'):
+                    cache.put(config, digest, replicate, result)
+        
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    
+    return results
+
+def run_experiment(models_to_run: list, n_per_condition: int, dry_run: bool = False,
+                   output_format: str = 'json', use_cache: bool = True):
     """Run the experiment."""
     
     trials = generate_trials(n_per_condition)
@@ -161,7 +306,7 @@ def run_experiment(models_to_run: list, n_per_condition: int, dry_run: bool = Fa
     print(f"  Total trials per model: {len(trials)}")
     print(f"\nMODELS: {', '.join(models_to_run)}")
     print(f"TOTAL API CALLS: {total_calls}")
-    print(f"ESTIMATED TIME: {total_calls * REQUEST_DELAY / 60:.1f} min")
+    print(f"ESTIMATED TIME: {len(trials) * REQUEST_DELAY / 60:.1f} min (models run in parallel)")
     print(f"DRY RUN: {dry_run}")
     print("=" * 70)
     
@@ -174,14 +319,13 @@ def run_experiment(models_to_run: list, n_per_condition: int, dry_run: bool = Fa
     # Initialize clients
     clients = {}
     call_funcs = {'claude': call_claude, 'gpt5': call_gpt, 'gemini': call_gemini}
-    client_funcs = {'claude': get_anthropic_client, 'gpt5': get_openai_client, 'gemini': get_gemini_client}
     
     for model_key in models_to_run:
         if dry_run:
             clients[model_key] = None
         else:
             try:
-                clients[model_key] = client_funcs[model_key]()
+                clients[model_key] = get_client(model_key)
                 print(f"✓ {model_key} initialized")
             except Exception as e:
                 print(f"✗ {model_key}: {e}")
@@ -200,62 +344,97 @@ def run_experiment(models_to_run: list, n_per_condition: int, dry_run: bool = Fa
         'trials': []
     }
     
-    call_count = 0
+    runnable = []
     for model_key in models_to_run:
-        config = MODELS[model_key]
-        client = clients.get(model_key)
-        
-        if client is None and not dry_run:
+        if clients.get(model_key) is None and not dry_run:
             print(f"\n⚠️  Skipping {model_key}")
             continue
-        
-        print(f"\n{'─'*70}")
-        print(f"MODEL: {model_key.upper()} ({config['name']})")
-        print(f"{'─'*70}")
-        
-        for trial in trials:
-            call_count += 1
-            pct = call_count / total_calls * 100
-            print(f"\r[{call_count}/{total_calls}] ({pct:.0f}%) {trial['condition'][:12]:12} | {trial['stimulus_id']}", 
-                  end="", flush=True)
-            
-            result = {
-                'model': model_key,
-                'model_name': config['name'],
-                **trial,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            if dry_run:
-                result['response'] = "[DRY RUN]"
-                result['success'] = True
-                result['dry_run'] = True
-            else:
-                api_result = call_funcs[model_key](client, trial['prompt'], config)
-                result.update(api_result)
-                time.sleep(REQUEST_DELAY)
-            
-            results['trials'].append(result)
-        
-        print()
+        runnable.append(model_key)
+    
+    print(f"\n{'─'*70}")
+    for model_key in runnable:
+        print(f"MODEL: {model_key.upper()} ({MODELS[model_key]['name']})")
+    print(f"{'─'*70}")
     
-    # Save results
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     models_str = "_".join(models_to_run)
-    filename = f"experiment_{models_str}_n{n_per_condition}_{timestamp}.json"
+    filename = f"experiment_{models_str}_n{n_per_condition}_{timestamp}.{output_format}"
     output_path = RAW_DIR / filename
     
-    with open(output_path, 'w') as f:
-        json.dump(results, f, indent=2)
+    # Every finished trial is also streamed to an NDJSON journal, so a
+    # crashed or interrupted run can still be analyzed from it
+    journal_path = output_path.with_suffix('.ndjson')
+    print(f"Streaming trials to: {journal_path}")
+    
+    cache = ResponseCache(RESPONSE_CACHE_PATH) if use_cache and not dry_run else None
+    if cache is not None:
+        print(f"Response cache: {RESPONSE_CACHE_PATH} ({len(cache)} stored)")
+    
+    # One worker per model; progress output is shared, so serialize it.
+    # tqdm redraws at most every 0.1 s, which matters once cache hits make
+    # calls near-instant; without it, every call prints a line
+    lock = threading.Lock()
+    call_count = 0
+    progress = tqdm(total=total_calls, unit='call') if tqdm is not None else None
+    
+    def report(model_key, trial):
+        nonlocal call_count
+        status = f"{model_key:6} | {trial['condition'][:12]:12} | {trial['stimulus_id']}"
+        with lock:
+            call_count += 1
+            if progress is not None:
+                progress.set_postfix_str(status, refresh=False)
+                progress.update()
+                return
+            pct = call_count / total_calls * 100
+            print(f"\r[{call_count}/{total_calls}] ({pct:.0f}%) {status}", end="", flush=True)
+    
+    # Set on Ctrl-C so the workers stop before their next API call instead
+    # of the pool waiting for every remaining trial
+    stop = threading.Event()
+    
+    with ExperimentWriter(journal_path, results['metadata']) as journal, \
+            ThreadPoolExecutor(max_workers=max(len(runnable), 1)) as pool:
+        futures = [
+            pool.submit(run_model_trials, model_key, clients.get(model_key),
+                        call_funcs[model_key], trials, dry_run, report, journal.append,
+                        cache, stop)
+            for model_key in runnable
+        ]
+        try:
+            # Keep the file ordered by model, then trial
+            for future in futures:
+                results['trials'].extend(future.result())
+        except KeyboardInterrupt:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            if progress is not None:
+                progress.close()
+            print(f"\nInterrupted; completed trials are in {journal_path}")
+            raise
+    
+    if progress is not None:
+        progress.close()
+    else:
+        print()
+    
+    if cache is not None:
+        cache.close()
+    
+    # Save results; the journal is only kept if it is the requested format
+    if output_path != journal_path:
+        save_experiment(results, output_path)
+        journal_path.unlink()
     
     # Summary
     success = sum(1 for t in results['trials'] if t.get('success'))
     failed = sum(1 for t in results['trials'] if not t.get('success'))
+    cached = sum(1 for t in results['trials'] if t.get('cached'))
     
     print("\n" + "=" * 70)
     print("COMPLETE")
     print("=" * 70)
-    print(f"Success: {success}, Failed: {failed}")
+    print(f"Success: {success}, Failed: {failed}, From cache: {cached}")
     print(f"Output: {output_path}")
     print(f"\nNext: python3 src/analysis/embeddings.py --file {filename}")
 
@@ -270,11 +449,22 @@ def main():
     parser.add_argument('--n', type=int, default=50,
                         help='Trials per condition')
     parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--format', choices=['json', 'parquet', 'ndjson'], default='json',
+                        help='Output file format (parquet requires pyarrow)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Call the API even for replicates already in the response cache')
     
     args = parser.parse_args()
     models = ['claude', 'gpt5', 'gemini'] if args.model == 'all' else [args.model]
     
-    run_experiment(models, args.n, args.dry_run)
+    # Fail before any API calls are made, not when the results are saved
+    if args.format == 'parquet':
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            parser.error(str(e))
+    
+    run_experiment(models, args.n, args.dry_run, args.format, not args.no_cache)
 
 if __name__ == "__main__":
     main()